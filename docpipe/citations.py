@@ -4,6 +4,13 @@ from typing import Match
 from .matchers import CitationMatcher, ExtractedMatch
 
 
+SPACE = r"[\s\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]"
+""" Any whitespace character, as matched by a Unicode whitespace class. The citation patterns are compiled with
+re.ASCII, which is much faster, but then the whitespace class only matches ASCII whitespace, so the Unicode spaces are
+listed explicitly.
+"""
+
+
 class AchprResolutionMatcher(CitationMatcher):
     """ Finds references to ACHPR resolutions in documents, of the form:
 
@@ -12,14 +19,13 @@ class AchprResolutionMatcher(CitationMatcher):
     ACHPR/Res.79 (XXXVIII) 05
     """
 
-    pattern_re = re.compile(
-        r"""\bACHPR/Res\.?\s*
-            (?P<num>\d+)\s*
-            \((EXT\.\s*OS\s*/\s*)?[XVILC1]+\)\s*
-            (?P<year>\d{2,4})
-        """,
-        re.X | re.I,
-        )
+    pattern_src = rf"""\bACHPR/Res\.?{SPACE}*
+            (?P<num>\d+){SPACE}*
+            \((?:EXT\.{SPACE}*OS{SPACE}*/{SPACE}*)?[XVILC1]+\){SPACE}*
+            (?P<year>\d{{2,4}})
+        """
+    pattern_flags = re.X | re.I | re.ASCII
+    required_literals = ("achpr/res",)
     href_pattern = "/akn/aa-au/statement/resolution/achpr/{year}/{num}"
     html_candidate_xpath = ".//text()[contains(., 'ACHPR') and not(ancestor::a)]"
     xml_candidate_xpath = ".//text()[contains(., 'ACHPR') and not(ancestor::ns:ref)]"
@@ -45,18 +51,21 @@ class ActMatcher(CitationMatcher):
     Act No. 3 of 92
     Income Tax Act, 1962 (No 58 of 1962)
     """
-    pattern_re = re.compile(
-        r"""\bAct,?\s*
-            ((19|20)\d{2}\s*)?
-            \(?
+    pattern_src = rf"""\bAct,?{SPACE}*
+            (?:(?:19|20)\d{{2}}{SPACE}*)?
+            (?:\({SPACE}*)?
             (?P<ref>
-              ([no\.]*\s*)?
-              (?P<num>\d+)\s*
-              of\s*
-              (?P<year>\d{4})
+              (?:[no.]+{SPACE}*)?
+              (?P<num>\d+){SPACE}*
+              of{SPACE}*
+              (?P<year>\d{{4}})
             )\)?
-        """,
-        re.X | re.I)
+        """
+    pattern_flags = re.X | re.I | re.ASCII
+    required_literals = ("act", "of")
+    prefilter_re = re.compile(rf"\d{SPACE}*of{SPACE}*\d{{4}}", re.I | re.ASCII)
+    """ Cheap check for the "<num> of <year>" portion that every match requires. "Act" is very common in legal
+    text, so this avoids running the full pattern on most candidates."""
     href_pattern = "/akn/{juri}/act/{year}/{num}"
     html_candidate_xpath = ".//text()[contains(., 'Act') and not(ancestor::a)]"
     xml_candidate_xpath = ".//text()[contains(., 'Act') and not(ancestor::ns:ref)]"
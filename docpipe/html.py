@@ -1,14 +1,24 @@
-import re
 import math
+from functools import lru_cache
+from xml.sax.saxutils import escape
 
-from lxml import html
+from lxml import etree, html
 from lxml.html.clean import Cleaner
-import cssutils
 
 from .pipeline import Stage, Pipeline
 from .xmlutils import unwrap_element, merge_adjacent
 
 
+@lru_cache(maxsize=None)
+def descendants_xpath(*tags):
+    """ Compiled XPath that finds descendants of the context node with any of the given tags.
+
+    Expressions are compiled once and cached here, rather than being held by the stages, so that stages can
+    still be pickled.
+    """
+    return etree.XPath('|'.join(f'.//{x}' for x in tags))
+
+
 class TextToHtmlText(Stage):
     """ Transform plain text into HTML-ready text.
 
@@ -16,14 +26,9 @@ class TextToHtmlText(Stage):
     Writes: context.html_text
     """
     def __call__(self, context):
-        root = html.Element("div")
-
-        for line in context.text.splitlines():
-            p = html.Element("p")
-            p.text = line
-            root.append(p)
-
-        context.html_text = html.tostring(root, pretty_print=True, encoding='unicode')
+        # build the html text directly, rather than building a tree and serialising it
+        paras = ''.join(f'<p>{escape(line)}</p>\n' for line in context.text.splitlines())
+        context.html_text = f'<div>\n{paras}</div>\n'
 
 
 class ParseHtml(Stage):
@@ -34,8 +39,11 @@ class ParseHtml(Stage):
     Reads: context.html_text
     Writes: context.html
     """
+    # parser shared across calls; subclasses may provide a differently configured lxml.html.HTMLParser
+    parser = html.html_parser
+
     def __call__(self, context):
-        context.html = html.fromstring(context.html_text)
+        context.html = html.fromstring(context.html_text, parser=self.parser)
         self.ensure_container_root(context)
 
     def ensure_container_root(self, context):
@@ -50,10 +58,16 @@ class NukeHiddenText(Stage):
     Reads: context.html
     Writes: context.html
     """
-
     def __call__(self, context):
-        for hidden_span in context.html.xpath('.//span[@style="display: none"]'):
-            hidden_span.getparent().remove(hidden_span)
+        hidden = [span for span in context.html.iterdescendants('span') if self.is_hidden(span)]
+        for span in hidden:
+            # drop_tree keeps the tail text, which is not hidden
+            span.drop_tree()
+
+    def is_hidden(self, span):
+        # eg. "display: none", "display:none;"
+        style = span.get('style')
+        return bool(style) and style.replace(' ', '').rstrip(';').lower() == 'display:none'
 
 
 class SerialiseHtml(Stage):
@@ -79,7 +93,8 @@ class CleanHtml(Stage):
     )
 
     def __call__(self, context):
-        context.html = self.cleaner.clean_html(context.html)
+        # clean the tree in place; Cleaner.clean_html would first make a deep copy of the entire tree
+        self.cleaner(context.html)
 
 
 class ExtractBody(Stage):
@@ -91,6 +106,9 @@ class ExtractBody(Stage):
     def __call__(self, context):
         body = context.html.find('body')
         if body is not None:
+            # detach the body and clear out the rest of the document (eg. head), so that lxml can free it
+            context.html.remove(body)
+            context.html.clear()
             context.html = body
 
 
@@ -114,8 +132,13 @@ class NormaliseHtmlTextWhitespace(Stage):
         # &nbsp; to space
         context.html_text = context.html_text.replace('&nbsp;', ' ')
 
-        # tabs to spaces, multiple spaces and newlines to one
-        context.html_text = re.sub(r'[\r\n\s]+', ' ', context.html_text)
+        # tabs to spaces, multiple spaces and newlines to one. str.split() splits on the same whitespace
+        # as the regex \s class, and is much faster than a regex substitution over the whole text.
+        text = context.html_text
+        words = text.split()
+        prefix = ' ' if text[:1].isspace() else ''
+        suffix = ' ' if words and text[-1:].isspace() else ''
+        context.html_text = prefix + ' '.join(words) + suffix
 
 
 class MergeUl(Stage):
@@ -124,8 +147,10 @@ class MergeUl(Stage):
     Reads: context.html
     Writes: context.html
     """
+    ul_xpath = etree.XPath('.//ul')
+
     def __call__(self, context):
-        for ul in context.html.xpath('.//ul'):
+        for ul in self.ul_xpath(context.html):
             prev = ul.getprevious()
             if prev is not None and prev.tag == 'ul':
                 # merge this ul into the previous one
@@ -134,6 +159,56 @@ class MergeUl(Stage):
                 ul.getparent().remove(ul)
 
 
+def parse_style(style):
+    """ Parse an inline CSS style attribute into a dict from property names to values.
+
+    This is a simple declaration splitter that is much cheaper than a full CSS parser. Declarations are split on
+    semicolons outside of parentheses and quotes, so that values like url(data:image/png;base64,...) survive.
+    Property names are lowercased, values are left as-is, and malformed declarations are ignored.
+    """
+    props = {}
+    for declaration in split_declarations(style or ''):
+        name, sep, value = declaration.partition(':')
+        name = name.strip().lower()
+        value = value.strip()
+        if sep and name and value:
+            props[name] = value
+    return props
+
+
+def split_declarations(style):
+    """ Split an inline CSS style attribute on semicolons that are not inside parentheses or quotes.
+    """
+    if '(' not in style and '"' not in style and "'" not in style:
+        return style.split(';')
+
+    declarations = []
+    start = 0
+    depth = 0
+    quote = None
+    for i, c in enumerate(style):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth = max(depth - 1, 0)
+        elif c == ';' and not depth:
+            declarations.append(style[start:i])
+            start = i + 1
+    declarations.append(style[start:])
+    return declarations
+
+
+def serialise_style(props):
+    """ Serialise a dict of CSS properties (such as from parse_style) into an inline style attribute.
+    """
+    return '; '.join(f'{name}: {value}' for name, value in props.items())
+
+
 class CleanTables(Stage):
     """ Clean tables in the html as follows:
 
@@ -145,8 +220,13 @@ class CleanTables(Stage):
     Reads: context.html
     Writes: context.html
     """
+    # padding properties that are always removed
+    padding_properties = 'padding padding-top padding-bottom padding-left padding-right'.split()
+    # border properties that are removed if they are set to none
+    border_properties = 'border border-top border-bottom border-left border-right'.split()
+
     def __call__(self, context):
-        for table in context.html.xpath('.//table'):
+        for table in context.html.iterdescendants('table'):
             # strip table width
             if table.attrib.get('width'):
                 table.attrib.pop('width')
@@ -157,46 +237,34 @@ class CleanTables(Stage):
             if table.attrib.get('cellspacing'):
                 table.attrib.pop('cellspacing')
 
-            for row in table.xpath('.//tr'):
-                total_row_width = sum([int(c.attrib['width'].replace('%', '')) for c in row if c.attrib.get('width')])
-                for cell in row:
-                    style = cssutils.parseStyle(cell.attrib.get('style'))
+            for row in table.iterdescendants('tr'):
+                cells = list(row)
+                widths = [int(c.attrib['width'].replace('%', '')) if c.attrib.get('width') else None for c in cells]
+                # guard against all widths being zero
+                total_row_width = sum(w for w in widths if w) or 1
+
+                for cell, width in zip(cells, widths):
+                    style = parse_style(cell.attrib.get('style'))
 
                     # normalize cell width to % based on total row width
-                    width = cell.attrib.get('width')
-                    if width:
-                        width = int(width.replace('%', ''))
+                    if width is not None:
                         w_pct = math.floor(width / total_row_width * 100)
                         style['width'] = f'{w_pct}%'
-                        cell.attrib['style'] = style.cssText.replace('\n', ' ')
+                        cell.attrib['style'] = serialise_style(style)
                         cell.attrib.pop('width')
 
-                    if style and cell.attrib.get('style'):
+                    if cell.attrib.get('style'):
                         # remove any padding
-                        style.removeProperty('padding')
-                        style.removeProperty('padding-top')
-                        style.removeProperty('padding-bottom')
-                        style.removeProperty('padding-left')
-                        style.removeProperty('padding-right')
+                        for prop in self.padding_properties:
+                            style.pop(prop, None)
 
                         # remove cell border styles that set any border to none
-                        if style.getPropertyValue('border') == 'none':
-                            style.removeProperty('border')
-
-                        if style.getPropertyValue('border-top') == 'none':
-                            style.removeProperty('border-top')
-
-                        if style.getPropertyValue('border-bottom') == 'none':
-                            style.removeProperty('border-bottom')
-
-                        if style.getPropertyValue('border-left') == 'none':
-                            style.removeProperty('border-left')
+                        for prop in self.border_properties:
+                            if style.get(prop, '').replace('!important', '').strip() == 'none':
+                                del style[prop]
 
-                        if style.getPropertyValue('border-right') == 'none':
-                            style.removeProperty('border-right')
-
-                        if style.getCssText():
-                            cell.attrib['style'] = style.cssText.replace('\n', ' ')
+                        if style:
+                            cell.attrib['style'] = serialise_style(style)
                         else:
                             cell.attrib.pop('style')
 
@@ -211,23 +279,26 @@ class StripWhitespace(Stage):
     Reads: context.html
     Writes: context.html
     """
-    whitespace = '  '
+    # space and non-breaking space
+    whitespace = ' \xa0'
     tags = "p h1 h2 h3 h4 h5 li td th".split()
 
     def __call__(self, context):
-        xpath = "|".join(f'.//{x}' for x in self.tags)
-        for elem in context.html.xpath(xpath):
-            # strip start
-            if elem.text:
-                elem.text = elem.text.lstrip(self.whitespace)
+        for elem in descendants_xpath(*self.tags)(context.html):
+            self.clean_element(elem)
+
+    def clean_element(self, elem):
+        # strip start
+        if elem.text:
+            elem.text = elem.text.lstrip(self.whitespace)
 
-            # strip end
-            kids = list(elem)
-            if kids:
-                if kids[-1].tail:
-                    kids[-1].tail = kids[-1].tail.rstrip(self.whitespace)
-            elif elem.text:
-                elem.text = elem.text.rstrip(self.whitespace)
+        # strip end
+        kids = list(elem)
+        if kids:
+            if kids[-1].tail:
+                kids[-1].tail = kids[-1].tail.rstrip(self.whitespace)
+        elif elem.text:
+            elem.text = elem.text.rstrip(self.whitespace)
 
 
 class MergeAdjacentInlines(Stage):
@@ -247,13 +318,14 @@ class MergeAdjacentInlines(Stage):
     tags = 'b i sup sub'.split()
 
     def __call__(self, context):
-        xpath = '|'.join(f'.//{x}' for x in self.tags)
+        for e in descendants_xpath(*self.tags)(context.html):
+            self.clean_element(e)
 
-        for e in context.html.xpath(xpath):
+    def clean_element(self, e):
+        nxt = e.getnext()
+        while nxt is not None and nxt.tag == e.tag and not e.tail:
+            merge_adjacent(e, nxt)
             nxt = e.getnext()
-            while nxt is not None and nxt.tag == e.tag and not e.tail:
-                merge_adjacent(e, nxt)
-                nxt = e.getnext()
 
 
 class RemoveEmptyInlines(Stage):
@@ -265,13 +337,37 @@ class RemoveEmptyInlines(Stage):
     tags = 'a b i sup sub'.split()
 
     def __call__(self, context):
-        xpath = '|'.join(f'.//{n}' for n in self.tags)
+        for node in descendants_xpath(*self.tags)(context.html):
+            self.clean_element(node)
+
+    def clean_element(self, node):
+        # node has no children, and either no text or just whitespace
+        # in the case of whitespace, it is preserved
+        if not list(node) and (not node.text or not node.text.strip()):
+            unwrap_element(node)
+
+
+class CleanInlinesAndWhitespace(Stage):
+    """ Does the work of MergeAdjacentInlines, RemoveEmptyInlines and StripWhitespace (in that order), but
+    only walks the tree once to find the elements for all three.
+
+    Reads: context.html
+    Writes: context.html
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stages = [MergeAdjacentInlines(), RemoveEmptyInlines(), StripWhitespace()]
+
+    def __call__(self, context):
+        tags = sorted({tag for stage in self.stages for tag in stage.tags})
+        elems = descendants_xpath(*tags)(context.html)
 
-        for node in context.html.xpath(xpath):
-            # node has no children, and either no text or just whitespace
-            # in the case of whitespace, it is preserved
-            if not list(node) and (not node.text or not node.text.strip()):
-                unwrap_element(node)
+        for stage in self.stages:
+            tags = set(stage.tags)
+            for elem in elems:
+                # skip elements that an earlier stage has removed from the tree
+                if elem.tag in tags and elem.getparent() is not None:
+                    stage.clean_element(elem)
 
 
 class SplitPOnBr(Stage):
@@ -284,69 +380,59 @@ class SplitPOnBr(Stage):
     Reads: context.html
     Writes: context.html
     """
+    p_xpath = etree.XPath('.//p[.//br]')
 
     def __call__(self, context):
-        for br in reversed(list(context.html.xpath('.//p//br'))):
-            # everything after the br moves into a new p tag
-            p = context.html.makeelement('p')
-            # reverse order of elements to be created afresh before hitting the ancestor p
-            # e.g. ['i', 'b'] in the case of <p><b><i>Text<br>text</i></b></p>
-            ancestor_tags = []
-            elements = []
-
-            # parent should be the original p, but we want to track everything on the way up too
-            parent = br.getparent()
-            while parent.tag != 'p':
-                ancestor_tags.append(parent.tag)
-                parent = parent.getparent()
-
-            for elem_tag in ancestor_tags:
-                elem = context.html.makeelement(elem_tag)
-                elements.append(elem)
-            elements.append(p)
-            # now we have e.g. [<i>, <b>, <p>]
-            # the lowest-down, <i> in the example but at minimum <p>,
-            # gets the text
-            for i, elem in enumerate(elements):
-                if i == 0:
-                    elem.text = br.tail
-
-                    # when the immediate sibling of br is a tag
-                    # e.g. <p>Text<br><i>italics</i></p>
-                    # -- make sure <italics> ends up in the right place
-                    sibling = br.getnext()
-                    while sibling is not None:
-                        elem.append(sibling)
-                        sibling = sibling.getnext()
-
-                    # when the br falls inside an intervening tag, e.g.
-                    # <p>Text 1 <b>bold 1<br>bold 2</b> text 2</p>
-                    # make sure ' text 2' ends up in the right place.
-                    #
-                    # This is the case when i > 0 and there are intervening tags. The tail of the main p is handled
-                    # at the end of the function.
-                    if i < len(elements) - 1:
-                        elem.tail = br.getparent().tail
-                        br.getparent().tail = None
-
-                    continue
-
-                # for all but the first / only element, append the lower-down one
-                # (if there's only one, <p>, nothing needs to be appended)
-                elem.append(elements[i - 1])
-
-            # e.g. <p><b>Text<br>text</b> <i>italics</i></p>
-            # -- make sure ' plain <i>italics</i>' goes after '<b>text<b>'
-            sibling = br.getparent().getnext()
-            if sibling is not None and len(ancestor_tags):
-                p.append(sibling)
-
-            # parent is the original p
-            # move tail text onto the new p
-            p.tail = parent.tail
-            parent.tail = None
-            parent.addnext(p)
-            br.getparent().remove(br)
+        for p in self.p_xpath(context.html):
+            # split from right to left, so that the earlier brs are still in p
+            for br in reversed(list(p.iter('br'))):
+                self.split_p(p, br)
+
+    def split_p(self, p, br):
+        """ Move everything after br into a new p tag after p, and remove br.
+        """
+        # br and its ancestors, up to but excluding p
+        # e.g. [<br>, <i>, <b>] in the case of <p><b><i>Text<br>text</i></b></p>
+        levels = []
+        elem = br
+        while elem is not p:
+            if elem.tag == 'p':
+                # br is inside a nested p, which will be split on its own
+                return
+            levels.append(elem)
+            elem = elem.getparent()
+
+        new_p = p.makeelement('p')
+        container = new_p
+
+        # work down from p to br, creating afresh each of br's ancestors in the new p. Everything after an
+        # ancestor (its tail and subsequent siblings) moves after the new copy of it.
+        # e.g. <p>Text 1 <b>bold 1<br>bold 2</b> text 2 <i>italics</i></p>
+        # ->   <p>Text 1 <b>bold 1</b></p>
+        #      <p><b>bold 2</b> text 2 <i>italics</i></p>
+        for elem in reversed(levels):
+            siblings = list(elem.itersiblings())
+
+            if elem is br:
+                container.text = br.tail
+                br.tail = None
+            else:
+                copy = p.makeelement(elem.tag)
+                copy.tail = elem.tail
+                elem.tail = None
+                container.append(copy)
+
+            for sibling in siblings:
+                container.append(sibling)
+
+            if elem is not br:
+                container = copy
+
+        # move tail text onto the new p
+        new_p.tail = p.tail
+        p.tail = None
+        p.addnext(new_p)
+        br.getparent().remove(br)
 
 
 class RemoveEmptyParagraphs(Stage):
@@ -358,14 +444,13 @@ class RemoveEmptyParagraphs(Stage):
 
     # tags that indicate a non-empty p, even if there is no text
     content_tags = ['img']
+    p_xpath = etree.XPath('.//p')
 
     def __call__(self, context):
-        xpath = '|'.join(f'.//{x}' for x in self.content_tags)
-
-        for p in context.html.xpath('.//p'):
-            text = (''.join(p.xpath('.//text()'))).strip()
+        for p in self.p_xpath(context.html):
+            text = ''.join(p.itertext()).strip()
 
-            if not text and not p.xpath(xpath):
+            if not text and next(p.iterdescendants(*self.content_tags), None) is None:
                 parent = p.getparent()
                 parent.remove(p)
                 p = parent
@@ -387,7 +472,5 @@ parse_and_clean = Pipeline([
     CleanHtml(),
     MergeUl(),
     CleanTables(),
-    MergeAdjacentInlines(),
-    RemoveEmptyInlines(),
-    StripWhitespace(),
+    CleanInlinesAndWhitespace(),
 ], name="Parse and clean", description="Parse HTML and do basic cleaning.")
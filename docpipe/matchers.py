@@ -1,9 +1,16 @@
+import copy
+import itertools
+import pickle
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Match, Iterable, Dict
+from functools import lru_cache
+from typing import Match, Iterable, Dict, Optional
 
 from lxml import etree
 
-from docpipe.xmlutils import wrap_text
+from docpipe.xmlutils import wrap_text_ranges
 
 
 @dataclass
@@ -17,13 +24,71 @@ class ExtractedMatch:
     """Start position of the match in the original context."""
     end: int = None
     """End position of the match in the original context."""
-    groups: Dict[str, str] = field(default_factory=dict)
-    """Regex group values."""
+    groups: Optional[Dict[str, str]] = None
+    """Regex group values. If not given, these are taken from the original match when they are first needed."""
+    href: Optional[str] = field(default=None, compare=False)
+    """Href for the match, once it has been calculated by a CitationMatcher."""
+    _href_computed: bool = field(default=False, repr=False, compare=False)
 
     @property
     def string(self):
         return self.original_match.string
 
+    def _get_groups(self) -> Dict[str, str]:
+        if self._groups is None:
+            self._groups = self.original_match.groupdict() if self.original_match is not None else {}
+        return self._groups
+
+    def _set_groups(self, groups: Optional[Dict[str, str]]):
+        self._groups = groups
+
+
+# groups is a dataclass field so that it can be given to __init__, but a property so that it's resolved lazily
+ExtractedMatch.groups = property(ExtractedMatch._get_groups, ExtractedMatch._set_groups)
+
+
+class DocumentState:
+    """ An attribute of a matcher that holds state for the document currently being processed. Each thread has its own
+    value, so that a matcher can process documents in several threads at once.
+    """
+    missing = object()
+
+    def __init__(self, default=missing):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        local = obj.__dict__.get('_local')
+        try:
+            return local.__dict__[self.name]
+        except (AttributeError, KeyError):
+            if self.default is self.missing:
+                raise AttributeError(self.name) from None
+            return self.default
+
+    def __set__(self, obj, value):
+        local = obj.__dict__.get('_local')
+        if local is None:
+            local = obj.__dict__.setdefault('_local', threading.local())
+        setattr(local, self.name, value)
+
+
+@lru_cache(maxsize=None)
+def compiled_xpath(xpath, prefix, ns):
+    return etree.XPath(xpath, namespaces={prefix: ns} if ns else {})
+
+
+@lru_cache(maxsize=4096)
+def format_href(href_pattern, args):
+    """ Format an href pattern with a tuple of (name, value) pairs. The same citation is often found many times, so
+    the result is cached.
+    """
+    return href_pattern.format(**dict(args))
+
 
 class TextPatternMatcher:
     """Logic for matching and marking up portions of text in paged text,  xml or html documents using regular
@@ -37,10 +102,20 @@ class TextPatternMatcher:
     xpath_ns_prefix = "ns"
 
     pattern_re = None
-    """ Compiled re pattern to be applied to the text. Must be defined by subclasses.
+    """ Compiled re pattern to be applied to the text. Subclasses must define either this or pattern_src.
+    """
+
+    pattern_src = None
+    """ Source of the re pattern to be applied to the text. If a subclass defines this, it is compiled into pattern_re
+    with pattern_flags once, when the class is defined. Use this for patterns that are built up from other class
+    attributes.
     """
 
-    ancestor_xpath = None
+    pattern_flags = 0
+    """ Flags for compiling pattern_src.
+    """
+
+    ancestor_xpath = DocumentState(None)
     """ Xpath for top-level ancestor nodes to anchor the DOM search. Default is the provided root noode.
     """
 
@@ -52,7 +127,7 @@ class TextPatternMatcher:
     """ Xpath for top-level ancestor nodes to anchor the search for XML. Default is the provided root noode.
     """
 
-    candidate_xpath = None
+    candidate_xpath = DocumentState(None)
     """ Xpath for candidate text nodes that should be tested for DOM matches.
     """
 
@@ -64,7 +139,7 @@ class TextPatternMatcher:
     """ Xpath for candidate text nodes that should be tested for XML matches. Defaults to text nodes.
     """
 
-    marker_tag = None
+    marker_tag = DocumentState(None)
     """ Tag that will be used to markup matches in DOM trees.
     """
 
@@ -76,24 +151,115 @@ class TextPatternMatcher:
     """ Tag that will be used to markup matches in XML.
     """
 
+    required_literals = ()
+    """ Literal strings that every match of pattern_re contains. Text that doesn't contain all of them is not searched
+    with pattern_re at all. If pattern_re is case-insensitive, these must be lowercase.
+
+    These are derived from the pattern, so they are reset for a subclass that changes pattern_src, pattern_flags or
+    pattern_re, unless it also sets them.
+    """
+
+    prefilter_re = None
+    """ Optional compiled pattern that is much cheaper than pattern_re, and that matches somewhere in any text that
+    pattern_re matches. Text that it doesn't match is not searched with pattern_re. Like required_literals, it is reset
+    for a subclass that changes the pattern, unless it also sets it.
+    """
+
+    match_cache_size = 1024
+    """ Maximum number of distinct chunks of text for which matches are remembered while processing a document.
+    Documents often repeat identical text, which then only needs to be matched once.
+    """
+
+    match_cache_max_length = 500
+    """ Chunks of text longer than this are never cached. Long chunks, such as whole pages of plain text, are seldom
+    repeated, and caching them would keep them (and their matches) in memory until the next document.
+    """
+
+    parallel_pages = 1
+    """ Number of worker processes to use for extracting matches from the pages of plain text. If this is greater
+    than one, pages are processed in parallel, and the matcher is pickled and sent to the workers.
+    """
+
+    frbr_uri = DocumentState()
+    text = DocumentState()
+    root = DocumentState()
+    pagenum = DocumentState()
+    match_cache = DocumentState()
+    ns = DocumentState()
+    nsmap = DocumentState()
+    marker_template = DocumentState()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        changed = 'pattern_src' in cls.__dict__ or ('pattern_flags' in cls.__dict__ and cls.pattern_src)
+        # recompile if this class changes the pattern, its flags or how it's compiled
+        if changed or ('compile_pattern' in cls.__dict__ and cls.pattern_src):
+            cls.pattern_re = cls.compile_pattern(cls.pattern_src, cls.pattern_flags)
+
+        # the prefilters were derived from the inherited pattern, and may drop matches of a new one
+        if changed or 'pattern_re' in cls.__dict__:
+            if 'required_literals' not in cls.__dict__:
+                cls.required_literals = ()
+            if 'prefilter_re' not in cls.__dict__:
+                cls.prefilter_re = None
+
+    @classmethod
+    def compile_pattern(cls, src, flags):
+        """Compile pattern_src into pattern_re. Subclasses may override this to use a different regex engine, provided
+        that the result supports the parts of the re.Pattern API that the matcher uses, such as finditer and search.
+        """
+        return re.compile(src, flags)
+
+    dom_state = ('root', 'ancestor_xpath', 'candidate_xpath', 'marker_template')
+    """ Document state that is only used for DOM matching, and which isn't pickled.
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # include the document state for this thread, except for DOM state such as compiled xpaths
+        local = state.pop('_local', None)
+        if local is not None:
+            state.update((k, v) for k, v in local.__dict__.items() if k not in self.dom_state)
+            # cached matches refer to re.Match objects, which can't be pickled
+            state['match_cache'] = {}
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def setup(self, frbr_uri, text=None, root=None):
         self.frbr_uri = frbr_uri
         self.text = text
         self.root = root
         self.pagenum = None
+        self.match_cache = {}
 
         if root is not None:
-            self.ns = self.root.nsmap[None] if self.root.nsmap else None
-            self.nsmap = {self.xpath_ns_prefix: self.ns} if self.ns else {}
-            self.marker_tag = (
-                "{%s}%s" % (self.ns, self.marker_tag) if self.ns else self.marker_tag
-            )
-            self.candidate_xpath = etree.XPath(
-                self.candidate_xpath, namespaces=self.nsmap
-            )
-            self.ancestor_xpath = etree.XPath(
-                self.ancestor_xpath, namespaces=self.nsmap
-            ) if self.ancestor_xpath else None
+            self.setup_dom(root)
+
+    def setup_dom(self, root):
+        """Prepare for DOM matching in a tree with the given root, such as by compiling the xpaths for its namespace."""
+        self.root = root
+        self.ns = self.root.nsmap[None] if self.root.nsmap else None
+        self.nsmap = {self.xpath_ns_prefix: self.ns} if self.ns else {}
+        # these may already have been namespaced and compiled by an earlier call
+        marker_tag = etree.QName(self.marker_tag).localname
+        self.marker_tag = "{%s}%s" % (self.ns, marker_tag) if self.ns else marker_tag
+        self.marker_template = self.make_marker_template()
+        self.candidate_xpath = self.compile_xpath(self.candidate_xpath)
+        self.ancestor_xpath = self.compile_xpath(self.ancestor_xpath) if self.ancestor_xpath else None
+
+    def make_marker_template(self):
+        """Create the element that is copied to markup each match."""
+        return etree.Element(self.marker_tag)
+
+    def compile_xpath(self, xpath):
+        """Compile an xpath expression (or re-use the expression of a compiled xpath) using the namespace of the
+        current document. Compiled xpaths are cached and shared between documents."""
+        if not isinstance(xpath, str):
+            xpath = xpath.path
+        return compiled_xpath(xpath, self.xpath_ns_prefix, self.ns)
 
     ### handle extraction from text
 
@@ -102,12 +268,64 @@ class TextPatternMatcher:
         self.setup(frbr_uri, text=text)
         self.extract_paged_text_matches()
 
-    def extract_paged_text_matches(self):
-        # split on form feed (page break)
-        for i, page in enumerate(self.text.split("\x0C")):
+    def extract_pages_matches(self, frbr_uri, pages):
+        """Extract matches in plain text that is provided as an iterable of pages, such as from
+        docpipe.pdf.pdf_to_pages. Each page is processed as soon as it is available."""
+        self.setup(frbr_uri)
+        self.extract_paged_text_matches(pages)
+
+    def extract_paged_text_matches(self, pages=None):
+        if pages is None:
+            pages = self.iter_pages()
+
+        if self.parallel_pages > 1:
+            self.extract_paged_text_matches_parallel(pages)
+            return
+
+        for i, page in enumerate(pages):
             self.pagenum = i
             self.run_text_extraction(page)
 
+    def extract_paged_text_matches_parallel(self, pages):
+        pages = list(pages)
+        # the matcher is pickled here, because its document state is only available in this thread, and is sent to
+        # each worker once; don't send the full text along with it
+        text, self.text = self.text, None
+        try:
+            matcher = pickle.dumps(self)
+        finally:
+            self.text = text
+
+        with ProcessPoolExecutor(max_workers=self.parallel_pages, initializer=init_page_worker,
+                                 initargs=(matcher,)) as executor:
+            chunksize = max(len(pages) // (self.parallel_pages * 4), 1)
+            for results in executor.map(extract_page, range(len(pages)), pages, chunksize=chunksize):
+                self.add_page_results(results)
+
+    def extract_page(self, pagenum, page):
+        """Run extraction on a single page and return the results, which are passed to add_page_results.
+        This is used when processing pages in parallel, and may run in a different process.
+        """
+        self.pagenum = pagenum
+        self.run_text_extraction(page)
+
+    def add_page_results(self, results):
+        """Add the results of extract_page, in page order."""
+        pass
+
+    def iter_pages(self):
+        """Yield each page of the text, without splitting the whole text up front. Pages are separated by
+        form feeds (page breaks)."""
+        text = self.text
+        start = 0
+        while True:
+            end = text.find("\x0C", start)
+            if end < 0:
+                yield text[start:]
+                return
+            yield text[start:end]
+            start = end + 1
+
     def run_text_extraction(self, text):
         for match in self.find_text_matches(text):
             if self.is_text_match_valid(text, match):
@@ -115,8 +333,43 @@ class TextPatternMatcher:
 
     def find_text_matches(self, text) -> Iterable[ExtractedMatch]:
         """Return an iterable of matches in this chunk of text."""
-        for m in self.pattern_re.finditer(text):
-            yield self.make_extracted_match(m)
+        cacheable = len(text) <= self.match_cache_max_length
+        matches = self.match_cache.get(text) if cacheable else None
+        if matches is None:
+            if self.could_match(text):
+                matches = [self.make_extracted_match(m) for m in self.pattern_re.finditer(text)]
+            else:
+                matches = []
+            if cacheable and len(self.match_cache) < self.match_cache_size:
+                self.match_cache[text] = matches
+        return matches
+
+    def find_first_text_match(self, text, start=0) -> Optional[ExtractedMatch]:
+        """Return the first match in this chunk of text at or after start, or None. This is cheaper than
+        find_text_matches when only the first match is needed. Matches aren't validated.
+        """
+        if self.could_match(text):
+            match = self.pattern_re.search(text, start)
+            if match:
+                return self.make_extracted_match(match)
+
+    def has_required_literals(self, text, lowered=None):
+        """Check if text contains all the required literals, and so could possibly match. If the pattern is
+        case-insensitive, lowered may be a lowercased version of text, to save doing it again.
+        """
+        if not self.required_literals:
+            return True
+        if self.pattern_re.flags & re.I:
+            text = lowered if lowered is not None else text.lower()
+        return all(lit in text for lit in self.required_literals)
+
+    def could_match(self, text, lowered=None):
+        """Check if text passes the cheap prefilters, required_literals and prefilter_re, and so could possibly match.
+        The literals are checked first, since lowercasing and searching for them is cheaper than prefilter_re.
+        """
+        if not self.has_required_literals(text, lowered):
+            return False
+        return self.prefilter_re is None or self.prefilter_re.search(text) is not None
 
     def is_text_match_valid(self, text, match: ExtractedMatch):
         return True
@@ -130,7 +383,6 @@ class TextPatternMatcher:
             match.group(),
             match.start(),
             match.end(),
-            match.groupdict(),
         )
 
     ### handle extraction from html and xml
@@ -153,50 +405,80 @@ class TextPatternMatcher:
 
         self.markup_dom_matches(frbr_uri, root)
 
+    def markup_xml_matches_stream(self, frbr_uri, source, tag='p', skip_ancestor='meta'):
+        """Extract matches from XML that is parsed incrementally from source (a filename or file-like object), so
+        that large documents don't have to be held in memory.
+
+        Each element with the given tag (in any namespace) is marked up and then yielded. It is cleared when the next
+        element is requested, so the caller must use it (such as by serializing it) before then. Elements inside
+        skip_ancestor elements are yielded without being marked up. Tag elements must not be nested.
+
+        Only text inside tag elements is marked up. Text elsewhere, such as in headings or list introductions, is
+        neither marked up nor kept.
+        """
+        self.marker_tag = self.xml_marker_tag
+        self.ancestor_xpath = None
+        self.candidate_xpath = self.xml_candidate_xpath
+        # set up now, so that a document without any tag elements doesn't keep an earlier document's state
+        self.setup(frbr_uri)
+
+        ready = False
+        for _, element in etree.iterparse(source, events=('end',), tag='{*}' + tag):
+            if not ready:
+                # the namespace is only known once there is an element
+                self.setup_dom(element)
+                ready = True
+            self.root = element
+
+            # free everything before the element, including earlier siblings of its ancestors
+            for node in itertools.chain([element], element.iterancestors()):
+                if node.getparent() is None:
+                    # the root element can be preceded by comments and processing instructions, which have no parent
+                    break
+                while node.getprevious() is not None:
+                    del node.getparent()[0]
+
+            if not skip_ancestor or next(element.iterancestors('{*}' + skip_ancestor), None) is None:
+                self.run_dom_matching()
+            yield element
+            element.clear(keep_tail=True)
+
     def markup_dom_matches(self, frbr_uri, root):
         """Extract matches in a parsed XML/HTML tree."""
         self.setup(frbr_uri, root=root)
         self.run_dom_matching()
 
     def run_dom_matching(self):
-        for ancestor in self.ancestor_nodes():
-            for candidate in self.candidate_text_nodes(ancestor):
-                node = candidate.getparent()
-
-                # TODO: this could probably be made simpler if we processed matches from right to left.
-                if not candidate.is_tail:
-                    # text directly inside a node
-                    for match in self.find_text_matches(node.text):
-                        new_node = self.handle_node_match(node, match, in_tail=False)
-                        if new_node is not None:
-                            # the node has now changed, making the offsets in any subsequent
-                            # matches incorrect. so stop looking and start again, checking
-                            # the tail of the newly inserted node
-                            node = new_node
-                            break
-
-                while node is not None and node.tail:
-                    for match in self.find_text_matches(node.tail):
-                        new_node = self.handle_node_match(node, match, in_tail=True)
-                        if new_node is not None:
-                            # the node has now changed, making the offsets in any subsequent
-                            # matches incorrect. so stop looking and start again, checking
-                            # the tail of the newly inserted node
-                            node = new_node
-                            break
-                    else:
-                        # we didn't break out of the loop, so there are no valid matches, give up
-                        node = None
-
-    def handle_node_match(self, node, match: ExtractedMatch, in_tail):
-        """Process a match. If this modifies the text (or tail, if in_tail is True), then
-        return the new node that should have its tail checked for further matches.
-        Otherwise, return None.
+        for node, in_tail in self.all_candidate_text_nodes():
+            self.markup_text_matches(node, node.tail if in_tail else node.text, in_tail)
+
+    def all_candidate_text_nodes(self):
+        """Return (node, in_tail) tuples for the candidate text nodes under all the ancestor nodes. The candidate text
+        is the text of node, or its tail if in_tail is True.
         """
-        if self.is_node_match_valid(node, match):
-            marker, start_pos, end_pos = self.markup_node_match(node, match)
-            if marker is not None:
-                return wrap_text(node, in_tail, lambda t: marker, start_pos, end_pos)
+        if self.ancestor_xpath is None:
+            # common case: search the whole tree, without looping over ancestors
+            return self.candidate_text_tuples(self.root)
+        return [c for ancestor in self.ancestor_nodes() for c in self.candidate_text_tuples(ancestor)]
+
+    def candidate_text_tuples(self, root):
+        """Return (node, in_tail) tuples for the candidate text nodes under root."""
+        if (self.candidate_xpath.path == ".//text()"
+                and type(self).candidate_text_nodes is TextPatternMatcher.candidate_text_nodes):
+            # the default; walking the tree is cheaper than evaluating the xpath
+            return self.all_text_nodes(root)
+        return [(text.getparent(), text.is_tail) for text in self.candidate_text_nodes(root)]
+
+    def markup_text_matches(self, node, text, in_tail):
+        """Find and markup matches in the text (or tail, if in_tail is True) of a node."""
+        markers = []
+        for match in self.find_text_matches(text):
+            if self.is_node_match_valid(node, match):
+                marker, start_pos, end_pos = self.markup_node_match(node, match)
+                if marker is not None:
+                    markers.append((marker, start_pos, end_pos))
+
+        wrap_text_ranges(node, in_tail, markers)
 
     def is_node_match_valid(self, node, match: ExtractedMatch):
         return True
@@ -211,7 +493,7 @@ class TextPatternMatcher:
 
         Element may be None to indicate that no markup should be inserted.
         """
-        marker = etree.Element(self.marker_tag)
+        marker = copy.copy(self.marker_template)
         marker.text = match.text
         return marker, match.start, match.end
 
@@ -223,10 +505,55 @@ class TextPatternMatcher:
     def candidate_text_nodes(self, root):
         return self.candidate_xpath(root)
 
+    def all_text_nodes(self, root):
+        """Return (node, in_tail) tuples for all text nodes under root, in document order. This is gathered up front,
+        because marking up matches adds to the tree."""
+        nodes = []
+        # an explicit stack rather than recursion, so that deeply nested trees don't hit the recursion limit
+        stack = [(root, False)]
+        while stack:
+            node, in_tail = stack.pop()
+            if in_tail:
+                nodes.append((node, True))
+                continue
+            # the text of comments and processing instructions isn't document text
+            if node.text and isinstance(node.tag, str):
+                nodes.append((node, False))
+            # push in reverse, so that each child is followed by its descendants and then its tail
+            for child in reversed(node):
+                if child.tail:
+                    stack.append((child, True))
+                stack.append((child, False))
+        return nodes
+
+
+page_worker_matcher = None
+
+
+def init_page_worker(matcher):
+    """ Initialise a worker process for extracting matches from pages, with a pickled matcher.
+    """
+    global page_worker_matcher
+    page_worker_matcher = pickle.loads(matcher)
+
+
+def extract_page(pagenum, page):
+    """ Run extraction for the worker's matcher on a single page and return the results.
+    """
+    return page_worker_matcher.extract_page(pagenum, page)
+
 
 @dataclass
 class ExtractedCitation:
-    """ An extracted citation."""
+    """ An extracted citation.
+
+    For plain text, start and end are offsets into the text (or page) that was searched. For HTML and XML, they are
+    offsets into the original text or tail of the node that contained the citation, as it was before any citations
+    in it were marked up, and there is no prefix or suffix.
+    """
+    # documents can have many thousands of citations; slots keep each one small
+    __slots__ = ('text', 'start', 'end', 'href', 'target_id', 'prefix', 'suffix')
+
     text: str
     start: int
     end: int
@@ -250,39 +577,74 @@ class CitationMatcher(TextPatternMatcher):
     text_prefix_length = 30
     text_suffix_length = 30
 
+    citations = DocumentState()
+    work_uri = DocumentState()
+    document_href_pattern = DocumentState()
+    string_pool = DocumentState()
+
     def setup(self, *args, **kwargs):
         super().setup(*args, **kwargs)
         self.citations = []
+        self.string_pool = {}
+        # a document doesn't cite itself
+        self.work_uri = self.frbr_uri.work_uri() if self.frbr_uri else None
+        self.document_href_pattern = self.bind_href_pattern()
+
+    def bind_href_pattern(self):
+        """Return the href_pattern for the current document, with anything that is the same for all matches in the
+        document (such as its jurisdiction) already filled in.
+        """
+        return self.href_pattern
+
+    def make_marker_template(self):
+        marker = super().make_marker_template()
+        # the href is always set, so make space for it up front
+        marker.set("href", "")
+        return marker
+
+    def extract_page(self, pagenum, page):
+        self.citations = []
+        super().extract_page(pagenum, page)
+        return self.citations
+
+    def add_page_results(self, results):
+        self.citations.extend(results)
 
     def handle_text_match(self, text, match: ExtractedMatch):
-        href = self.make_href(match)
+        href = self.match_href(match)
         if href:
+            string = match.string
+            start, end = match.start, match.end
+            # identical strings are often repeated in a document, so share a single copy of each
+            pool = self.string_pool
+            prefix = string[max(start - self.text_prefix_length, 0):start]
+            suffix = string[end:end + self.text_suffix_length]
             self.citations.append(
                 ExtractedCitation(
-                    match.text,
-                    match.start,
-                    match.end,
+                    pool.setdefault(match.text, match.text),
+                    start,
+                    end,
                     href,
                     self.pagenum,
-                    # prefix
-                    match.string[max(match.start - self.text_prefix_length, 0):match.start],
-                    # suffix
-                    match.string[match.end:min(match.end + self.text_suffix_length, len(match.string))],
+                    # prefix (a negative start would wrap around)
+                    pool.setdefault(prefix, prefix),
+                    # suffix (slicing stops at the end of the string)
+                    pool.setdefault(suffix, suffix),
                 )
             )
 
     def is_node_match_valid(self, node, match):
-        href = self.make_href(match)
-        return href and href != self.frbr_uri.work_uri()
+        href = self.match_href(match)
+        return href and href != self.work_uri
 
     def is_text_match_valid(self, text, match):
-        href = self.make_href(match)
-        return href and href != self.frbr_uri.work_uri()
+        href = self.match_href(match)
+        return href and href != self.work_uri
 
     def markup_node_match(self, node, match):
         """Markup the match with a ref tag. The first group in the match is substituted with the ref."""
-        href = self.make_href(match)
-        if not href or href == self.frbr_uri.work_uri():
+        href = self.match_href(match)
+        if not href or href == self.work_uri:
             return None, None, None
 
         node, start, end = super().markup_node_match(node, match)
@@ -292,11 +654,142 @@ class CitationMatcher(TextPatternMatcher):
         )
         return node, start, end
 
+    def match_href(self, match: ExtractedMatch):
+        """Get the href for this match, which is calculated by make_href only once per match."""
+        if not match._href_computed:
+            match.href = self.make_href(match)
+            match._href_computed = True
+        return match.href
+
     def make_href(self, match: ExtractedMatch):
-        """Turn this match into a full FRBR URI href using the href_pattern. Subclasses can also
-        override this method to do more complex things.
+        """Turn this match into a full FRBR URI href using the href_pattern (as bound to the document). Subclasses
+        can also override this method to do more complex things.
         """
-        return self.href_pattern.format(**self.href_pattern_args(match))
+        return format_href(self.document_href_pattern, tuple(self.href_pattern_args(match).items()))
 
     def href_pattern_args(self, match: ExtractedMatch):
         return match.groups
+
+
+INLINE_FLAGS = [(re.A, 'a'), (re.I, 'i'), (re.M, 'm'), (re.S, 's'), (re.X, 'x')]
+
+
+def alternative_pattern(name, pattern):
+    """ Wrap pattern in a group with this name, scoping its flags to the group and prefixing its group names
+    so that they are unique in a combined pattern.
+    """
+    src = re.sub(r'\(\?P([<=])(\w+)', rf'(?P\1{name}_\2', pattern.pattern)
+    flags = ''.join(c for flag, c in INLINE_FLAGS if pattern.flags & flag)
+    if pattern.flags & re.X:
+        # a trailing comment must not swallow the closing parenthesis
+        src += '\n'
+    return f'(?P<{name}>(?{flags}:{src}))'
+
+
+@lru_cache(maxsize=None)
+def combined_pattern(patterns):
+    """ Combine a tuple of patterns into one, with an alternative named m0, m1, etc. for each. The result is cached,
+    so that composite matchers for the same matchers share a compiled pattern.
+    """
+    return re.compile('|'.join(alternative_pattern(f'm{i}', p) for i, p in enumerate(patterns)))
+
+
+class AlternativeMatch:
+    """ The portion of a match of a combined pattern that belongs to one of its alternatives, presented as if the
+    alternative's own pattern had matched. Only named groups are available.
+    """
+    def __init__(self, match: Match, name):
+        self.match = match
+        self.name = name
+        self.prefix = name + '_'
+        self.string = match.string
+
+    def group(self, group=0):
+        return self.match.group(self.name if group == 0 else self.prefix + group)
+
+    def groupdict(self, default=None):
+        n = len(self.prefix)
+        return {
+            k[n:]: v
+            for k, v in self.match.groupdict(default).items()
+            if k.startswith(self.prefix)
+        }
+
+    def start(self, group=0):
+        return self.match.start(self.name if group == 0 else self.prefix + group)
+
+    def end(self, group=0):
+        return self.match.end(self.name if group == 0 else self.prefix + group)
+
+    def span(self, group=0):
+        return self.start(group), self.end(group)
+
+
+class CompositeTextPatternMatcher(TextPatternMatcher):
+    """ Runs several matchers over plain text in a single pass, by combining their patterns into one regular
+    expression with a named alternative for each matcher.
+
+    Each match is handed to the matcher whose alternative matched, for validation and handling, so the matchers
+    behave as if they had been run individually, except that matches from different matchers may not overlap.
+    Patterns must not use numbered backreferences. Citations from all matchers are collected in document order
+    in `citations`.
+
+    DOM matching is delegated to each matcher in turn, since each selects its own candidate nodes.
+    """
+    citations = DocumentState()
+
+    def __init__(self, matchers):
+        """Matchers may be matcher instances or classes."""
+        self.matchers = [m() if isinstance(m, type) else m for m in matchers]
+        names = [f'm{i}' for i in range(len(self.matchers))]
+        self.pattern_re = combined_pattern(tuple(m.pattern_re for m in self.matchers))
+        # the outermost group of a match's alternative is the last one to close, so it is the match's lastindex
+        self.alternatives = {
+            self.pattern_re.groupindex[name]: (name, m)
+            for name, m in zip(names, self.matchers)
+        }
+
+    def setup(self, *args, **kwargs):
+        super().setup(*args, **kwargs)
+        for matcher in self.matchers:
+            matcher.setup(*args, **kwargs)
+        self.reset_citations()
+
+    def reset_citations(self):
+        self.citations = []
+        for matcher in self.matchers:
+            if hasattr(matcher, 'citations'):
+                # collect all citations in one list, in order
+                matcher.citations = self.citations
+
+    def extract_page(self, pagenum, page):
+        self.reset_citations()
+        super().extract_page(pagenum, page)
+        return self.citations
+
+    def add_page_results(self, results):
+        self.citations.extend(results)
+
+    def run_text_extraction(self, text):
+        lowered = text.lower()
+        if not any(m.could_match(text, lowered) for m in self.matchers):
+            return
+
+        for m in self.pattern_re.finditer(text):
+            name, matcher = self.alternatives[m.lastindex]
+            match = matcher.make_extracted_match(AlternativeMatch(m, name))
+            if matcher.is_text_match_valid(text, match):
+                matcher.pagenum = self.pagenum
+                matcher.handle_text_match(text, match)
+
+    def markup_html_matches(self, frbr_uri, root):
+        self.citations = []
+        for matcher in self.matchers:
+            matcher.markup_html_matches(frbr_uri, root)
+            self.citations.extend(getattr(matcher, 'citations', []))
+
+    def markup_xml_matches(self, frbr_uri, root):
+        self.citations = []
+        for matcher in self.matchers:
+            matcher.markup_xml_matches(frbr_uri, root)
+            self.citations.extend(getattr(matcher, 'citations', []))
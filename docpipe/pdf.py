@@ -1,4 +1,6 @@
+import io
 import subprocess
+import tempfile
 from .pipeline import Stage
 
 
@@ -9,14 +11,88 @@ class PdfToText(Stage):
     Writes: context.text
     """
     extra_args = ["-nopgbrk", "-raw"]
+    in_process = False
+    """ Extract text in-process with pypdfium2 (if it is installed) rather than running pdftotext. This avoids starting
+    a process for each PDF, but the text is laid out differently, and extra_args are ignored.
+    """
 
     def __call__(self, context):
-        context.text = pdf_to_text(context.source_file.name, context.cropbox, self.extra_args)
+        if self.in_process:
+            context.text = pdf_to_text_inproc(context.source_file.name, context.cropbox, self.extra_args)
+        else:
+            context.text = pdf_to_text(context.source_file.name, context.cropbox, self.extra_args)
 
 
 def pdf_to_text(fname, cropbox=None, extras=None):
     """ Extract text from a pdf.
     """
+    result = subprocess.run(pdf_to_text_cmd(fname, cropbox, extras), capture_output=True, check=True)
+    return result.stdout.decode('utf-8')
+
+
+def pdf_to_pages(fname, cropbox=None, extras=None, chunk_size=64 * 1024):
+    """ Extract text from a pdf, yielding the text of each page (separated by form feeds) as soon as pdftotext has
+    produced it. As with splitting the output of pdf_to_text on form feeds, the last page is whatever follows the
+    last form feed.
+    """
+    # stderr goes to a temporary file rather than a pipe, so that pdftotext can't block on it while we read stdout
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(pdf_to_text_cmd(fname, cropbox, extras), stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            reader = io.TextIOWrapper(proc.stdout, encoding='utf-8', newline='')
+            # the pieces of the current page; only new chunks are split, so a long page isn't re-scanned
+            pieces = []
+            while True:
+                chunk = reader.read(chunk_size)
+                if not chunk:
+                    break
+                parts = chunk.split('\x0C')
+                if len(parts) > 1:
+                    pieces.append(parts[0])
+                    yield ''.join(pieces)
+                    yield from parts[1:-1]
+                    pieces = []
+                pieces.append(parts[-1])
+            yield ''.join(pieces)
+        finally:
+            proc.stdout.close()
+            retcode = proc.wait()
+
+        if retcode:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(retcode, proc.args, stderr=stderr.read())
+
+
+def pdf_to_text_inproc(fname, cropbox=None, extras=None):
+    """ Extract text from a pdf in this process using pypdfium2, with pages separated by form feeds. If pypdfium2 isn't
+    installed, this falls back to using pdftotext with the extra arguments.
+    """
+    try:
+        import pypdfium2
+    except ImportError:
+        return pdf_to_text(fname, cropbox, extras)
+
+    pdf = pypdfium2.PdfDocument(fname)
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            if cropbox:
+                # left, top, width, height from the top left, as for pdftotext; pdfium measures from the bottom left
+                left, top, width, height = (float(i) for i in cropbox)
+                page_height = page.get_height()
+                pages.append(textpage.get_text_bounded(
+                    left=left, bottom=page_height - top - height, right=left + width, top=page_height - top))
+            else:
+                pages.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return "\x0C".join(pages)
+    finally:
+        pdf.close()
+
+
+def pdf_to_text_cmd(fname, cropbox=None, extras=None):
     cmd = ["pdftotext", "-enc", "UTF-8"] + (extras or [])
 
     if cropbox:
@@ -27,5 +103,4 @@ def pdf_to_text(fname, cropbox=None, extras=None):
         cmd += [x for pair in cropbox for x in pair]
 
     cmd += [fname, '-']
-    result = subprocess.run(cmd, capture_output=True, check=True)
-    return result.stdout.decode('utf-8')
+    return cmd
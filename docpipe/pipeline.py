@@ -1,4 +1,6 @@
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 log = logging.getLogger(__name__)
 
@@ -43,6 +45,21 @@ class Pipeline(Stage):
 
         self.after(context)
 
+    def run_many(self, contexts, workers=None, chunksize=1):
+        """ Run this pipeline over many contexts in parallel using a pool of worker processes, and yield the resulting
+        contexts in order.
+
+        The pipeline and contexts are pickled to send them to the workers, and the resulting contexts are pickled
+        to send them back. This means that the yielded contexts are copies of the originals, and the pipeline must
+        not leave unpicklable values (such as parsed lxml trees) in the contexts.
+
+        :param contexts: iterable of contexts to process
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param chunksize: number of contexts to send to a worker at a time
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(run_pipeline, repeat(self), contexts, chunksize=chunksize)
+
     def before(self, context):
         pass
 
@@ -56,6 +73,13 @@ class Pipeline(Stage):
         pass
 
 
+def run_pipeline(pipeline, context):
+    """ Run a pipeline (or stage) on a context and return the context.
+    """
+    pipeline(context)
+    return context
+
+
 class Attachment:
     """ An attachment object for stashing files to a document pipeline context.
     """
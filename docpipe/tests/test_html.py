@@ -1,7 +1,9 @@
 from unittest import TestCase
 
-from docpipe.html import TextToHtmlText, ParseHtml, SerialiseHtml, StripWhitespace, SplitPOnBr
-from docpipe.pipeline import PipelineContext
+from docpipe.html import TextToHtmlText, ParseHtml, SerialiseHtml, StripWhitespace, SplitPOnBr, CleanTables, \
+    NormaliseHtmlTextWhitespace, MergeAdjacentInlines, RemoveEmptyInlines, CleanInlinesAndWhitespace, \
+    RemoveEmptyParagraphs, NukeHiddenText, ExtractBody, parse_style
+from docpipe.pipeline import Pipeline, PipelineContext
 
 
 class HtmlTestCase(TestCase):
@@ -34,6 +36,16 @@ one
 </div>""",
             context.html_text.strip())
 
+    def test_normalise_html_text_whitespace(self):
+        context = PipelineContext(pipeline=None)
+        context.html_text = "\n<p>one\t two&nbsp; three\r\n\xa0four</p>\n\n"
+        NormaliseHtmlTextWhitespace()(context)
+        self.assertEqual(" <p>one two three four</p> ", context.html_text)
+
+        context.html_text = " \n "
+        NormaliseHtmlTextWhitespace()(context)
+        self.assertEqual(" ", context.html_text)
+
     def test_strip_whitespace(self):
         self.assertMultiLineEqual(
             """<div>
@@ -49,6 +61,58 @@ one
 </div>
 """, StripWhitespace()).strip())
 
+    def test_clean_inlines_and_whitespace(self):
+        html = """
+<div>
+<p> <b> </b> text <b>bold</b><b> more</b> </p>
+<h1><b><i>a</i></b><b><i>b</i></b><i></i> </h1>
+<ul><li> <sup>1</sup><sup></sup><sup>2</sup> x<a href="#"></a> </li></ul>
+</div>
+"""
+        self.assertMultiLineEqual(
+            """<div>
+<p>text <b>bold more</b></p>
+<h1><b><i>ab</i></b></h1>
+<ul><li><sup>12</sup> x</li></ul>
+</div>""",
+            self.run_html_stage(html, CleanInlinesAndWhitespace()).strip())
+        # same as running the stages individually
+        self.assertMultiLineEqual(
+            self.run_html_stage(html, Pipeline([MergeAdjacentInlines(), RemoveEmptyInlines(), StripWhitespace()])),
+            self.run_html_stage(html, CleanInlinesAndWhitespace()))
+
+    def test_clean_tables_zero_widths(self):
+        self.assertMultiLineEqual(
+            """<div><table><tr><td style="width: 0%">one</td><td style="width: 0%">two</td></tr></table></div>""",
+            self.run_html_stage(
+                """<div><table><tr><td width="0">one</td><td width="0%">two</td></tr></table></div>""",
+                CleanTables()).strip())
+
+    def test_extract_body(self):
+        context = PipelineContext(pipeline=None)
+        context.html_text = "<html><head><title>x</title></head><body><p>text</p></body></html>"
+        ParseHtml()(context)
+        ExtractBody()(context)
+        self.assertEqual("body", context.html.tag)
+        self.assertIsNone(context.html.getparent())
+        SerialiseHtml()(context)
+        self.assertEqual("<body><p>text</p></body>", context.html_text)
+
+    def test_nuke_hidden_text(self):
+        self.assertMultiLineEqual(
+            """<div><p>1. Section 1</p><p>2. Section 2 <span style="display: inline">visible</span></p></div>""",
+            self.run_html_stage(
+                """<div><p><span style="display: none">[PCh1s1]</span>1. Section 1</p>"""
+                """<p><span style="display:none;">[PCh1s2]</span>2. Section 2 <span style="display: inline">visible</span></p></div>""",
+                NukeHiddenText()).strip())
+
+    def test_remove_empty_paragraphs(self):
+        self.assertMultiLineEqual(
+            """<div><p><img src="x"></p><p>text</p></div>""",
+            self.run_html_stage(
+                """<div><p> </p><div><p><b> </b></p></div><p><img src="x"></p><p>text</p><p><!-- c --></p></div>""",
+                RemoveEmptyParagraphs()).strip())
+
     def test_split_p_on_br(self):
         self.assertMultiLineEqual(
             """<div>
@@ -202,6 +266,19 @@ one
 <div>
 <p>First <br/> second</p>tail
 </div>
+""", SplitPOnBr()).strip().replace('</p><p>', '</p>\n<p>'))
+
+    def test_split_p_on_br_many_siblings(self):
+        self.assertMultiLineEqual(
+            """<div>
+<p>text 1 <b>bold 1</b></p>
+<p><b>bold 2 <i>italics</i> more <u>underline</u></b> text 2 <i>italics</i> text 3</p>
+<p><sup>1</sup> text 4</p>
+</div>""",
+            self.run_html_stage("""
+<div>
+<p>text 1 <b>bold 1<br>bold 2 <i>italics</i> more <u>underline</u></b> text 2 <i>italics</i> text 3<br><sup>1</sup> text 4</p>
+</div>
 """, SplitPOnBr()).strip().replace('</p><p>', '</p>\n<p>'))
 
     def test_split_p_on_br_weird(self):
@@ -225,3 +302,43 @@ one
     text 5</p>
 </div>
 """.replace('\n    ', ''), SplitPOnBr()).strip().replace('</p><p>', '</p>\n<p>'))
+
+    def test_clean_tables(self):
+        self.assertMultiLineEqual(
+            """<div>
+<table>
+<tr>
+<td style="width: 25%">one</td>
+<td style="color: red; width: 75%">two</td>
+</tr>
+<tr>
+<td style="border-top: 1px solid">three</td>
+<td>four</td>
+</tr>
+</table>
+</div>""",
+            self.run_html_stage("""
+<div>
+<table width="500" cellpadding="2" cellspacing="0">
+<tr>
+<td width="100" height="20" style="padding: 2px">one</td>
+<td width="300" style="Color: red; padding-left: 0">two</td>
+</tr>
+<tr>
+<td style="border-top: 1px solid; border-bottom: none">three</td>
+<td style="padding: 0; border: none !important">four</td>
+</tr>
+</table>
+</div>
+""", CleanTables()).strip())
+
+    def test_parse_style_semicolons_in_values(self):
+        self.assertEqual({
+            'background': 'url(a;b.png)',
+            'list-style-image': 'url(data:image/png;base64,AAAA)',
+            'font-family': '"a;b", serif',
+            'width': '10%',
+        }, parse_style(
+            'background: url(a;b.png); list-style-image: url(data:image/png;base64,AAAA);'
+            'font-family: "a;b", serif; width: 10%'
+        ))
@@ -1,12 +1,15 @@
 # flake8: noqa
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 
 import lxml.html
 from lxml import etree
 from cobalt import FrbrUri
 
-from docpipe.citations import AchprResolutionMatcher, ActMatcher
-from docpipe.matchers import ExtractedCitation
+from docpipe.citations import AchprResolutionMatcher, ActMatcher, SPACE
+from docpipe.matchers import ExtractedCitation, ExtractedMatch, CompositeTextPatternMatcher, TextPatternMatcher
 
 
 class RefsAchprResolutionMatcherTest(TestCase):
@@ -146,6 +149,14 @@ class RefsAchprResolutionMatcherTest(TestCase):
             self.marker.citations,
         )
 
+    def test_text_matches_case_insensitive(self):
+        self.marker.extract_text_matches(self.frbr_uri, "see achpr/res.227 (lii) 2012 and Act 5 of 2009")
+
+        self.assertEqual(
+            ["/akn/aa-au/statement/resolution/achpr/2012/227"],
+            [c.href for c in self.marker.citations],
+        )
+
 
 class RefsActMatcherTest(TestCase):
     maxDiff = None
@@ -304,6 +315,85 @@ class RefsActMatcherTest(TestCase):
             self.marker.citations,
         )
 
+    def test_xml_matches_stream(self):
+        source = io.BytesIO(b"""<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">
+  <statement name="statement">
+    <meta>
+      <p>No markup outside of main content Act 15 of 2007</p>
+    </meta>
+    <preamble>
+      <p eId="preamble__p_1"><b>Recalling </b> Act 25 of 2020, the Need to Prepare</p>
+      <p eId="preamble__p_2">No markup inside existing <ref href="#foo">Act 12 of 2021</ref> ref tags.</p>
+      <p eId="preamble__p_3">Recalling Act 1 of 1992 and Act 2 of 1993</p>
+    </preamble>
+    <mainBody>
+      <section eId="sec_1">
+        <heading>Only p tags are marked up, not Act 3 of 1994</heading>
+        <content>
+          <p eId="sec_1__p_1">Recalling Act 4 of 1995</p>
+        </content>
+      </section>
+    </mainBody>
+  </statement>
+</akomaNtoso>""")
+
+        preceding = []
+
+        def stream():
+            for p in self.marker.markup_xml_matches_stream(self.frbr_uri, source):
+                preceding.append(len(p.xpath('preceding::*')))
+                yield etree.tostring(p, encoding='unicode', with_tail=False)
+
+        self.assertEqual([
+            '<p xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">No markup outside of main content Act 15 of 2007</p>',
+            '<p xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0" eId="preamble__p_1"><b>Recalling </b> '
+            '<ref href="/akn/za/act/2020/25">Act 25 of 2020</ref>, the Need to Prepare</p>',
+            '<p xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0" eId="preamble__p_2">No markup inside existing '
+            '<ref href="#foo">Act 12 of 2021</ref> ref tags.</p>',
+            '<p xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0" eId="preamble__p_3">Recalling '
+            '<ref href="/akn/za/act/1992/1">Act 1 of 1992</ref> and <ref href="/akn/za/act/1993/2">Act 2 of 1993</ref></p>',
+            '<p xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0" eId="sec_1__p_1">Recalling '
+            '<ref href="/akn/za/act/1995/4">Act 4 of 1995</ref></p>',
+        ], list(stream()))
+        self.assertEqual(
+            ["/akn/za/act/2020/25", "/akn/za/act/1992/1", "/akn/za/act/1993/2", "/akn/za/act/1995/4"],
+            [c.href for c in self.marker.citations],
+        )
+        # everything before each element, including the heading, has been freed
+        self.assertEqual([0, 0, 0, 0, 0], preceding)
+
+    def test_xml_matches_stream_leading_comment(self):
+        source = io.BytesIO(b"""<?xml version="1.0"?>
+<!-- a comment -->
+<?some-pi?>
+<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">
+  <statement name="statement">
+    <preamble>
+      <p>Recalling Act 25 of 2020</p>
+      <p>Recalling Act 1 of 1992</p>
+    </preamble>
+  </statement>
+</akomaNtoso>""")
+
+        self.assertEqual(2, len(list(self.marker.markup_xml_matches_stream(self.frbr_uri, source))))
+        self.assertEqual(["/akn/za/act/2020/25", "/akn/za/act/1992/1"], [c.href for c in self.marker.citations])
+
+    def test_xml_matches_stream_without_tag_elements(self):
+        source = io.BytesIO(b"""<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">
+  <statement name="statement"><preamble><p>Recalling Act 25 of 2020</p></preamble></statement>
+</akomaNtoso>""")
+        list(self.marker.markup_xml_matches_stream(self.frbr_uri, source))
+        self.assertEqual(["/akn/za/act/2020/25"], [c.href for c in self.marker.citations])
+
+        # nothing is left over from the previous document
+        frbr_uri = FrbrUri.parse("/akn/na/act/2021/1")
+        source = io.BytesIO(b"""<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">
+  <statement name="statement"><preamble><blockList/></preamble></statement>
+</akomaNtoso>""")
+        self.assertEqual([], list(self.marker.markup_xml_matches_stream(frbr_uri, source)))
+        self.assertEqual([], self.marker.citations)
+        self.assertEqual(frbr_uri, self.marker.frbr_uri)
+
     def test_text_matches(self):
         text = """
   Recalling Act 25 of 2020, the Need to Prepare
@@ -369,3 +459,403 @@ class RefsActMatcherTest(TestCase):
             ],
             self.marker.citations,
         )
+
+    def test_html_matches_repeated(self):
+        html = lxml.html.fromstring(
+            """
+<div>
+  <p>In terms of Act 25 of 2020 and Act 1 of 1992.</p>
+  <p>In terms of Act 25 of 2020 and Act 1 of 1992.</p>
+</div>
+"""
+        )
+        self.marker.markup_html_matches(self.frbr_uri, html)
+
+        self.assertMultiLineEqual(
+            """<div>
+  <p>In terms of <a href="/akn/za/act/2020/25">Act 25 of 2020</a> and <a href="/akn/za/act/1992/1">Act 1 of 1992</a>.</p>
+  <p>In terms of <a href="/akn/za/act/2020/25">Act 25 of 2020</a> and <a href="/akn/za/act/1992/1">Act 1 of 1992</a>.</p>
+</div>""",
+            lxml.html.tostring(html, encoding="unicode", pretty_print=True).strip(),
+        )
+        self.assertEqual(4, len(self.marker.citations))
+
+    def test_reuse_for_html_and_xml(self):
+        xml = """<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">
+  <act name="act"><body><p>See Act 25 of 2020.</p></body></act>
+</akomaNtoso>"""
+
+        for i in range(2):
+            html = lxml.html.fromstring("<div><p>See Act 25 of 2020.</p></div>")
+            self.marker.markup_html_matches(self.frbr_uri, html)
+            self.assertEqual(
+                '<div><p>See <a href="/akn/za/act/2020/25">Act 25 of 2020</a>.</p></div>',
+                lxml.html.tostring(html, encoding="unicode"),
+            )
+
+            root = etree.fromstring(xml)
+            self.marker.markup_xml_matches(self.frbr_uri, root)
+            self.assertIn(
+                '<p>See <ref href="/akn/za/act/2020/25">Act 25 of 2020</ref>.</p>',
+                etree.tostring(root, encoding="unicode"),
+            )
+
+    def test_html_matches_many_per_node(self):
+        html = lxml.html.fromstring(
+            '<div><p>Act 1 of 2009 and Act 2 of 2010 <b>x</b> then Act 3 of 2011 and Act 4 of 2012.</p></div>'
+        )
+        self.marker.markup_html_matches(self.frbr_uri, html)
+
+        self.assertEqual(
+            '<div><p><a href="/akn/za/act/2009/1">Act 1 of 2009</a> and <a href="/akn/za/act/2010/2">Act 2 of 2010</a> '
+            '<b>x</b> then <a href="/akn/za/act/2011/3">Act 3 of 2011</a> and <a href="/akn/za/act/2012/4">Act 4 of 2012</a>.'
+            '</p></div>',
+            lxml.html.tostring(html, encoding='unicode'),
+        )
+        self.assertEqual(
+            ["/akn/za/act/2009/1", "/akn/za/act/2010/2", "/akn/za/act/2011/3", "/akn/za/act/2012/4"],
+            [c.href for c in self.marker.citations],
+        )
+
+    def test_text_matches_parallel(self):
+        text = "\x0C".join(f"Page {i} recalls Act {i} of 2020 and Act {i + 1} of 2021." for i in range(10))
+        self.marker.extract_text_matches(self.frbr_uri, text)
+        expected = self.marker.citations
+
+        marker = ActMatcher()
+        marker.parallel_pages = 2
+        marker.extract_text_matches(self.frbr_uri, text)
+        self.assertEqual(20, len(marker.citations))
+        self.assertEqual(expected, marker.citations)
+
+    def test_text_matches_parallel_after_html(self):
+        html = lxml.html.fromstring('<div><p>Recalling Act 25 of 2020</p></div>')
+        marker = ActMatcher()
+        marker.parallel_pages = 2
+        marker.markup_html_matches(self.frbr_uri, html)
+
+        marker.extract_text_matches(self.frbr_uri, "Recalling Act 1 of 2009\x0CRecalling Act 2 of 2010")
+        self.assertEqual(["/akn/za/act/2009/1", "/akn/za/act/2010/2"], [c.href for c in marker.citations])
+
+    def test_pages_matches(self):
+        pages = [f"Page {i} recalls Act {i} of 2020 and Act {i + 1} of 2021." for i in range(3)]
+        self.marker.extract_text_matches(self.frbr_uri, "\x0C".join(pages))
+        expected = self.marker.citations
+
+        self.marker.extract_pages_matches(self.frbr_uri, iter(pages))
+        self.assertEqual(6, len(self.marker.citations))
+        self.assertEqual(expected, self.marker.citations)
+
+    def test_href_pattern_args_juri(self):
+        class OtherJuriActMatcher(ActMatcher):
+            def href_pattern_args(self, match):
+                args = super().href_pattern_args(match)
+                args['juri'] = 'na'
+                return args
+
+        class OwnHrefActMatcher(ActMatcher):
+            def make_href(self, match):
+                return self.href_pattern.format(**self.href_pattern_args(match))
+
+        marker = OtherJuriActMatcher()
+        marker.extract_text_matches(self.frbr_uri, "Recalling Act 1 of 2009")
+        self.assertEqual(["/akn/na/act/2009/1"], [c.href for c in marker.citations])
+
+        marker = OwnHrefActMatcher()
+        marker.extract_text_matches(self.frbr_uri, "Recalling Act 1 of 2009")
+        self.assertEqual(["/akn/za/act/2009/1"], [c.href for c in marker.citations])
+
+    def test_text_matches_no_frbr_uri(self):
+        marker = ActMatcher()
+        marker.extract_text_matches(None, "nothing here")
+        self.assertEqual([], marker.citations)
+
+    def test_pages_not_cached(self):
+        pages = [f"Page {i} recalls Act {i} of 2020. " + "Lorem ipsum dolor sit amet. " * 50 for i in range(3)]
+        self.marker.extract_pages_matches(self.frbr_uri, iter(pages))
+        self.assertEqual(3, len(self.marker.citations))
+
+        # neither the pages nor matches that refer to them are kept once extraction is done
+        self.assertEqual({}, self.marker.match_cache)
+
+        # short, repeated chunks are still cached
+        self.marker.extract_pages_matches(self.frbr_uri, iter(["Act 1 of 2020", "Act 1 of 2020"]))
+        self.assertEqual(["Act 1 of 2020"], list(self.marker.match_cache))
+
+    def test_text_matches_long_whitespace(self):
+        # this used to backtrack quadratically over the whitespace, taking seconds
+        self.marker.extract_text_matches(self.frbr_uri, "Act" + " " * 20000 + "of 2001, and Act 5 of 2000")
+        self.assertEqual(["Act 5 of 2000"], [c.text for c in self.marker.citations])
+
+    def test_text_matches_whitespace_after_bracket(self):
+        self.marker.extract_text_matches(self.frbr_uri, "Act ( No 5 of 2000) and Act ( 6 of 2001)")
+        self.assertEqual(
+            [("Act ( No 5 of 2000)", "/akn/za/act/2000/5"), ("Act ( 6 of 2001)", "/akn/za/act/2001/6")],
+            [(c.text, c.href) for c in self.marker.citations],
+        )
+        # the ref doesn't include the whitespace after the bracket
+        self.assertEqual(
+            ["No 5 of 2000", "6 of 2001"],
+            [m.groups['ref'] for m in self.marker.find_text_matches("Act ( No 5 of 2000) and Act ( 6 of 2001)")],
+        )
+
+    def test_text_matches_share_strings(self):
+        self.marker.extract_text_matches(self.frbr_uri, "Recalling Act 1 of 2009; \x0CRecalling Act 1 of 2009; ")
+        first, second = self.marker.citations
+
+        self.assertEqual(first.text, second.text)
+        self.assertIs(first.text, second.text)
+        self.assertIs(first.prefix, second.prefix)
+        self.assertIs(first.suffix, second.suffix)
+
+    def test_threads_have_own_state(self):
+        self.marker.extract_text_matches(self.frbr_uri, "Recalling Act 1 of 2009")
+
+        def other():
+            self.marker.extract_text_matches(FrbrUri.parse("/akn/na/act/2021/1"), "Recalling Act 2 of 2010")
+            return [c.href for c in self.marker.citations]
+
+        with ThreadPoolExecutor(1) as executor:
+            self.assertEqual(["/akn/na/act/2010/2"], executor.submit(other).result())
+        self.assertEqual(["/akn/za/act/2009/1"], [c.href for c in self.marker.citations])
+
+    def test_html_matches_offsets_into_node_text(self):
+        html = lxml.html.fromstring('<div><p>Act 1 of 2009 and Act, 1962 (No 58 of 1962)</p></div>')
+        self.marker.markup_html_matches(self.frbr_uri, html)
+
+        # offsets are into the node's original text, not the text after the previous marker
+        self.assertEqual(
+            [("Act 1 of 2009", 0, 13), ("Act, 1962 (No 58 of 1962)", 18, 43)],
+            [(c.text, c.start, c.end) for c in self.marker.citations],
+        )
+
+    def test_href_made_once_per_match(self):
+        calls = []
+
+        class CountingActMatcher(ActMatcher):
+            def make_href(self, match):
+                calls.append(match.text)
+                return super().make_href(match)
+
+        html = lxml.html.fromstring('<div><p>Recalling Act 25 of 2020 and Act 1 of 2009</p></div>')
+        marker = CountingActMatcher()
+        marker.markup_html_matches(self.frbr_uri, html)
+        self.assertEqual(["/akn/za/act/2020/25", "/akn/za/act/2009/1"], [c.href for c in marker.citations])
+
+        marker.extract_text_matches(self.frbr_uri, "Recalling Act 25 of 2020 and Act 1 of 2009")
+        self.assertEqual(["/akn/za/act/2020/25", "/akn/za/act/2009/1"], [c.href for c in marker.citations])
+
+        self.assertEqual(["Act 25 of 2020", "Act 1 of 2009", "Act 25 of 2020", "Act 1 of 2009"], calls)
+
+    def test_text_matches_nbsp(self):
+        text = "Recalling Act\xa025 of\xa02020, the Need to Prepare"
+        self.marker.extract_text_matches(self.frbr_uri, text)
+
+        self.assertEqual(
+            [
+                ExtractedCitation(
+                    "Act\xa025 of\xa02020", 10, 24, "/akn/za/act/2020/25", 0,
+                    'Recalling ',
+                    ', the Need to Prepare',
+                ),
+            ],
+            self.marker.citations,
+        )
+
+    def test_text_matches_unicode_spaces(self):
+        text = "Recalling Act 5\u202fof 2019, Act\u20096 of\u20032020 and Act\u30007 of 2021"
+        self.marker.extract_text_matches(self.frbr_uri, text)
+        self.assertEqual(
+            ["/akn/za/act/2019/5", "/akn/za/act/2020/6", "/akn/za/act/2021/7"],
+            [c.href for c in self.marker.citations],
+        )
+
+    def test_space_matches_unicode_whitespace(self):
+        chars = [chr(i) for i in range(0x10000)]
+        self.assertEqual(
+            [c for c in chars if re.match(r'\s', c)],
+            [c for c in chars if re.match(SPACE, c, re.ASCII)],
+        )
+
+
+class FooMatcher(TextPatternMatcher):
+    pattern_src = r'\bfoo\b'
+
+
+class TextPatternMatcherTest(TestCase):
+    def test_all_text_nodes(self):
+        html = lxml.html.fromstring('<div>a<p>b<!-- c -->d<b>e</b>f</p>g</div>')
+        self.assertEqual(
+            [(t.getparent(), t.is_tail) for t in html.xpath('.//text()')],
+            FooMatcher().all_text_nodes(html),
+        )
+
+    def test_all_text_nodes_deep(self):
+        depth = 2000
+        xml = etree.fromstring('<a>' * depth + 'foo' + '</a>x' * (depth - 1) + '</a>', etree.XMLParser(huge_tree=True))
+        nodes = FooMatcher().all_text_nodes(xml)
+        self.assertEqual([(t.getparent(), t.is_tail) for t in xml.xpath('.//text()')], nodes)
+        self.assertEqual(depth, len(nodes))
+
+    def test_candidate_text_nodes_override(self):
+        class ParagraphFooMatcher(FooMatcher):
+            def candidate_text_nodes(self, root):
+                return root.xpath('.//p/text()')
+
+        html = lxml.html.fromstring('<div>foo<p>a foo <b>foo</b> foo</p> foo</div>')
+        ParagraphFooMatcher().markup_html_matches(None, html)
+        self.assertEqual(
+            '<div>foo<p>a <mark>foo</mark> <b>foo</b> <mark>foo</mark></p> foo</div>',
+            lxml.html.tostring(html, encoding='unicode'),
+        )
+
+    def test_pattern_src(self):
+        class FooBarMatcher(FooMatcher):
+            pattern_flags = re.I
+
+        self.assertEqual(re.compile(r'\bfoo\b'), FooMatcher.pattern_re)
+        self.assertEqual(re.compile(r'\bfoo\b', re.I), FooBarMatcher.pattern_re)
+        self.assertIs(FooMatcher.pattern_re, FooMatcher().pattern_re)
+
+    def test_compile_pattern(self):
+        class JitActMatcher(ActMatcher):
+            @classmethod
+            def compile_pattern(cls, src, flags):
+                # stand-in for another regex engine
+                return re.compile(src + '(?#jit)', flags)
+
+        self.assertIsNot(ActMatcher.pattern_re, JitActMatcher.pattern_re)
+        self.assertEqual(re.compile(ActMatcher.pattern_src + '(?#jit)', ActMatcher.pattern_flags), JitActMatcher.pattern_re)
+
+        marker = JitActMatcher()
+        marker.extract_text_matches(FrbrUri.parse("/akn/za/act/2021/509"), "Recalling Act 1 of 2009")
+        self.assertEqual(["/akn/za/act/2009/1"], [c.href for c in marker.citations])
+
+    def test_prefilters_reset_with_pattern(self):
+        class StatuteMatcher(ActMatcher):
+            pattern_src = r"\bStatute\s(?P<num>\d+)/(?P<year>\d{4})"
+
+        class StatuteReMatcher(ActMatcher):
+            pattern_re = re.compile(r"\bStatute\s(?P<num>\d+)/(?P<year>\d{4})")
+
+        class ActLiteralsMatcher(ActMatcher):
+            pattern_flags = re.X | re.ASCII
+            required_literals = ("Act",)
+
+        for cls in [StatuteMatcher, StatuteReMatcher]:
+            self.assertEqual((), cls.required_literals)
+            self.assertIsNone(cls.prefilter_re)
+
+            marker = cls()
+            marker.extract_text_matches(FrbrUri.parse("/akn/za/act/2021/509"), "Recalling Statute 1/2009")
+            self.assertEqual(["/akn/za/act/2009/1"], [c.href for c in marker.citations])
+
+        # prefilters set alongside the pattern are kept
+        self.assertEqual(("Act",), ActLiteralsMatcher.required_literals)
+        self.assertIsNone(ActLiteralsMatcher.prefilter_re)
+
+    def test_find_first_text_match(self):
+        marker = FooMatcher()
+
+        match = marker.find_first_text_match("a foo and a foo")
+        self.assertEqual((2, 5), (match.start, match.end))
+        match = marker.find_first_text_match("a foo and a foo", 3)
+        self.assertEqual((12, 15), (match.start, match.end))
+        self.assertIsNone(marker.find_first_text_match("a food"))
+
+    def test_extracted_match_groups(self):
+        m = re.search(r'(?P<x>foo)', 'a foo')
+        self.assertEqual({'x': 'foo'}, ExtractedMatch(m, 'foo', 2, 5).groups)
+        self.assertEqual({'x': 'bar'}, ExtractedMatch(m, 'foo', 2, 5, groups={'x': 'bar'}).groups)
+        self.assertIn("groups={'x': 'foo'}", repr(ExtractedMatch(m, 'foo', 2, 5)))
+
+        # the href is cached on the match, and doesn't affect equality
+        match = ExtractedMatch(m, 'foo', 2, 5)
+        match.href = '/akn/za/act/2009/1'
+        self.assertEqual(ExtractedMatch(m, 'foo', 2, 5), match)
+        self.assertNotEqual(ExtractedMatch(m, 'foo', 2, 5, groups={'x': 'bar'}), match)
+
+    def test_html_matches(self):
+        html = lxml.html.fromstring('<div>foo<p>a foo <!-- foo --> foo <b>foo</b> foo</p> foo food</div>')
+        FooMatcher().markup_html_matches(None, html)
+
+        self.assertEqual(
+            '<div><mark>foo</mark><p>a <mark>foo</mark> <!-- foo --> <mark>foo</mark> <b><mark>foo</mark></b> '
+            '<mark>foo</mark></p> <mark>foo</mark> food</div>',
+            lxml.html.tostring(html, encoding='unicode'),
+        )
+
+
+class CompositeTextPatternMatcherTest(TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.marker = CompositeTextPatternMatcher([AchprResolutionMatcher, ActMatcher])
+        self.frbr_uri = FrbrUri.parse("/akn/za/act/2009/1")
+
+    def test_text_matches(self):
+        text = """
+  Recalling ACHPR/Res.227 (LII) 2012 and Act 25 of 2020, the Need to Prepare
+  \x0CRecalling Income Tax Act, 1962 (No 58 of 1962) and ACHPR/Res.79 (XXXVIII) 05
+"""
+        self.marker.extract_text_matches(self.frbr_uri, text)
+
+        self.assertEqual(
+            [
+                ExtractedCitation(
+                    "ACHPR/Res.227 (LII) 2012", 13, 37, "/akn/aa-au/statement/resolution/achpr/2012/227", 0,
+                    '\n  Recalling ',
+                    ' and Act 25 of 2020, the Need ',
+                ),
+                ExtractedCitation(
+                    "Act 25 of 2020", 42, 56, "/akn/za/act/2020/25", 0,
+                    ' ACHPR/Res.227 (LII) 2012 and ',
+                    ', the Need to Prepare\n  ',
+                ),
+                ExtractedCitation(
+                    "Act, 1962 (No 58 of 1962)", 21, 46, "/akn/za/act/1962/58", 1,
+                    'Recalling Income Tax ',
+                    ' and ACHPR/Res.79 (XXXVIII) 05',
+                ),
+                ExtractedCitation(
+                    "ACHPR/Res.79 (XXXVIII) 05", 51, 76, "/akn/aa-au/statement/resolution/achpr/2005/79", 1,
+                    'Act, 1962 (No 58 of 1962) and ',
+                    '\n',
+                ),
+            ],
+            self.marker.citations,
+        )
+
+    def test_text_matches_parallel(self):
+        text = "\x0C".join(
+            f"Page {i} recalls ACHPR/Res.{i} (LII) 2012 and Act {i} of 2020, but not Act {i}."
+            for i in range(20)
+        )
+        self.marker.extract_text_matches(self.frbr_uri, text)
+        expected = self.marker.citations
+        self.assertEqual(40, len(expected))
+
+        marker = CompositeTextPatternMatcher([AchprResolutionMatcher(), ActMatcher()])
+        marker.parallel_pages = 2
+        marker.extract_text_matches(self.frbr_uri, text)
+        self.assertEqual(expected, marker.citations)
+
+    def test_pattern_shared(self):
+        marker = CompositeTextPatternMatcher([AchprResolutionMatcher(), ActMatcher()])
+        self.assertIs(self.marker.pattern_re, marker.pattern_re)
+
+    def test_html_matches(self):
+        html = lxml.html.fromstring(
+            '<div><p>Recalling ACHPR/Res.227 (LII) 2012 and Act 25 of 2020</p></div>'
+        )
+        self.marker.markup_html_matches(self.frbr_uri, html)
+
+        self.assertEqual(
+            '<div><p>Recalling <a href="/akn/aa-au/statement/resolution/achpr/2012/227">ACHPR/Res.227 (LII) 2012</a>'
+            ' and <a href="/akn/za/act/2020/25">Act 25 of 2020</a></p></div>',
+            lxml.html.tostring(html, encoding='unicode'),
+        )
+        self.assertEqual(
+            ["/akn/aa-au/statement/resolution/achpr/2012/227", "/akn/za/act/2020/25"],
+            [c.href for c in self.marker.citations],
+        )
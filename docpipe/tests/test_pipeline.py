@@ -0,0 +1,29 @@
+import pickle
+from unittest import TestCase
+
+from docpipe.html import TextToHtmlText, parse_and_clean
+from docpipe.pipeline import Pipeline, PipelineContext, Stage
+
+
+class UpperCase(Stage):
+    def __call__(self, context):
+        context.text = context.text.upper()
+
+
+class PipelineTestCase(TestCase):
+    def test_run_many(self):
+        pipeline = Pipeline([UpperCase(), TextToHtmlText()])
+        contexts = []
+        for text in ["one", "two", "three"]:
+            context = PipelineContext(pipeline)
+            context.text = text
+            contexts.append(context)
+
+        results = list(pipeline.run_many(contexts, workers=2))
+
+        self.assertEqual(
+            ["<div>\n<p>ONE</p>\n</div>\n", "<div>\n<p>TWO</p>\n</div>\n", "<div>\n<p>THREE</p>\n</div>\n"],
+            [c.html_text for c in results])
+
+    def test_pipelines_are_picklable(self):
+        pickle.dumps(parse_and_clean)
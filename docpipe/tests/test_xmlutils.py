@@ -2,7 +2,7 @@ from unittest import TestCase
 
 from lxml import etree
 
-from docpipe.xmlutils import wrap_text, unwrap_element
+from docpipe.xmlutils import wrap_text, wrap_text_ranges, unwrap_element
 
 
 class WrapTextTestCase(TestCase):
@@ -77,6 +77,19 @@ class WrapTextTestCase(TestCase):
   <p>foo <b>bar</b> b<wrap>a</wrap>z</p>
 </root>""", etree.tostring(self.xml, encoding='unicode').strip())
 
+    def test_wrap_text_ranges(self):
+        self.xml = etree.fromstring("""
+<root>
+  <p>foo bar baz<b>x</b> qux quux</p>
+</root>""")
+        p = self.xml.find('p')
+
+        wrap_text_ranges(p, False, [(self.wrap('foo'), 0, 3), (self.wrap('baz'), 8, 11)])
+        wrap_text_ranges(p.find('b'), True, [(self.wrap('qux'), 1, 4), (self.wrap('quux'), 5, 9)])
+        self.assertMultiLineEqual("""<root>
+  <p><wrap>foo</wrap> bar <wrap>baz</wrap><b>x</b> <wrap>qux</wrap> <wrap>quux</wrap></p>
+</root>""", etree.tostring(self.xml, encoding='unicode').strip())
+
 
 class UnwrapElementTestCase(TestCase):
     def test_unwrap_elem_first_child_complex(self):
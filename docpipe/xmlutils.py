@@ -25,6 +25,36 @@ def wrap_text(node, tail, wrapper, start_pos=None, end_pos=None):
     return wrapped
 
 
+def wrap_text_ranges(node, tail, ranges):
+    """Replace several ranges of the text (or tail if tail is True) of a node with elements, in one edit.
+    Ranges is a list of (element, start_pos, end_pos) tuples, in order and not overlapping. The caller is responsible
+    for the content of the elements, which replace the text between start_pos and end_pos.
+    """
+    if not ranges:
+        return
+
+    text = (node.tail if tail else node.text) or ""
+    for i, (element, start_pos, end_pos) in enumerate(ranges):
+        next_start = ranges[i + 1][1] if i + 1 < len(ranges) else len(text)
+        element.tail = text[end_pos:next_start]
+    elements = [r[0] for r in ranges]
+    start_pos = ranges[0][1]
+
+    # insert each element after the previous one, rather than by index, which is O(siblings) to find
+    if tail:
+        node.tail = text[:start_pos]
+        previous = node
+    else:
+        node.text = text[:start_pos]
+        node.insert(0, elements[0])
+        previous = elements[0]
+        elements = elements[1:]
+
+    for element in elements:
+        previous.addnext(element)
+        previous = element
+
+
 def unwrap_element(elem):
     """ Unwrap text and children inside elem, making them children
     of elem's parents.